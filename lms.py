@@ -7,16 +7,18 @@ This cleaned version fixes syntax errors, duplicated functions and integrates
 all previously added analytics and admin reset features.
 
 Run: python3 project_lib.py
-Dependencies (optional): matplotlib, tabulate
+Batch issue/return: python3 project_lib.py --batch commands.txt
+Dependencies (optional): matplotlib, tabulate, numpy
 """
 
 import os
 import sqlite3
 import hashlib
+import hmac
 import getpass
 import datetime
-import shutil
 import sys
+from functools import lru_cache
 
 # Optional niceties
 try:
@@ -29,16 +31,155 @@ try:
 except Exception:
     plt = None
 
+try:
+    import numpy as np
+except Exception:
+    np = None
+
 DB_FILE = 'library.db'
 BACKUP_DIR = 'backups'
+BACKUP_INDEX = os.path.join(BACKUP_DIR, 'index.txt')
 DATEFMT = '%Y-%m-%d'
 
+# Fixed-shape statements. Keeping every query as a module constant means each
+# one is parsed once and then served from the connection's statement cache.
+SQL_INSERT_USER = 'INSERT INTO users (username,password,role,created_at) VALUES (?,?,?,?)'
+SQL_SELECT_USER = 'SELECT * FROM users WHERE id=?'
+SQL_SELECT_USER_BY_NAME = 'SELECT * FROM users WHERE username=?'
+SQL_AUTHENTICATE = 'SELECT id, username, role, created_at, password FROM users WHERE username=?'
+SQL_UPDATE_PASSWORD = 'UPDATE users SET password=? WHERE id=?'
+SQL_UPDATE_PASSWORD_BY_NAME = 'UPDATE users SET password=? WHERE username=?'
+SQL_UPDATE_USERNAME = 'UPDATE users SET username=? WHERE id=?'
+SQL_UPDATE_ROLE = 'UPDATE users SET role=? WHERE id=?'
+SQL_UPDATE_USERNAME_ROLE = 'UPDATE users SET username=?,role=? WHERE id=?'
+SQL_DELETE_USER = 'DELETE FROM users WHERE id=?'
+SQL_INSERT_BOOK = 'INSERT INTO books (title,author,category,status) VALUES (?,?,?,"Available")'
+SQL_SELECT_BOOK = 'SELECT * FROM books WHERE id=?'
+SQL_UPDATE_BOOK = 'UPDATE books SET title=?,author=?,category=?,status=? WHERE id=?'
+SQL_DELETE_BOOK = 'DELETE FROM books WHERE id=?'
+SQL_UPDATE_BOOK_STATUS_ISSUED = 'UPDATE books SET status="Issued" WHERE id=?'
+SQL_UPDATE_BOOK_STATUS_AVAILABLE = 'UPDATE books SET status="Available" WHERE id=?'
+SQL_INSERT_ISSUE = 'INSERT INTO issues (book_id,user_id,issue_date,return_date,returned) VALUES (?,?,?,?,0)'
+SQL_SELECT_ISSUE = 'SELECT * FROM issues WHERE id=?'
+SQL_MARK_ISSUE_RETURNED = 'UPDATE issues SET returned=1 WHERE id=?'
+
+# Seeding (seed_demo_data)
+SQL_COUNT_USERS = 'SELECT COUNT(*) FROM users'
+SQL_COUNT_BOOKS = 'SELECT COUNT(*) FROM books'
+SQL_COUNT_ISSUES = 'SELECT COUNT(*) FROM issues'
+SQL_SEED_BOOK_IDS = 'SELECT id FROM books ORDER BY id LIMIT 9'
+SQL_SEED_USER_IDS = "SELECT id FROM users WHERE role='user'"
+SQL_SEED_MARK_ISSUED = "UPDATE books SET status='Issued' WHERE id IN (SELECT book_id FROM issues WHERE returned=0)"
+
+# Read-path queries for listings, search, the dashboard and analytics
+SQL_LIST_ISSUED = '''
+SELECT issues.id as issue_id, books.id as book_id, books.title, users.username, issues.issue_date, issues.return_date, issues.returned
+FROM issues
+JOIN books ON books.id = issues.book_id
+JOIN users ON users.id = issues.user_id
+WHERE issues.returned=0
+ORDER BY issues.issue_date DESC
+'''
+SQL_SEARCH_TITLE = 'SELECT * FROM books WHERE title LIKE ?'
+SQL_SEARCH_AUTHOR = 'SELECT * FROM books WHERE author LIKE ?'
+SQL_SEARCH_CATEGORY = 'SELECT * FROM books WHERE category LIKE ?'
+SQL_LIST_BOOKS = 'SELECT * FROM books'
+# admin book list: the current borrower comes from the same query, never a
+# per-book lookup into issues
+SQL_LIST_BOOKS_STATUS = '''
+SELECT b.id, b.title, b.author, b.category, b.status,
+       COALESCE(u.username, '-'), COALESCE(i.issue_date, '-')
+FROM books b
+LEFT JOIN issues i ON i.book_id = b.id AND i.returned = 0
+LEFT JOIN users u ON u.id = i.user_id
+ORDER BY b.id
+'''
+SQL_BOOKS_BY_STATUS = 'SELECT * FROM books WHERE status=?'
+SQL_LIST_USERS = 'SELECT id,username,role,created_at FROM users'
+SQL_BOOK_STATUSES = 'SELECT id, status FROM books'
+SQL_USER_IDS = 'SELECT id FROM users'
+SQL_OPEN_ISSUES = 'SELECT id, book_id FROM issues WHERE returned=0'
+SQL_MONTHLY_ISSUES = "SELECT substr(issue_date,1,7) AS month, COUNT(*) FROM issues GROUP BY month ORDER BY month"
+SQL_MONTHLY_RETURNS = "SELECT substr(return_date,1,7) AS month, COUNT(*) FROM issues WHERE return_date IS NOT NULL GROUP BY month ORDER BY month"
+SQL_CATEGORY_AVAILABILITY = "SELECT category, COUNT(*) FROM books WHERE status='Available' GROUP BY category"
+SQL_USER_ISSUE_HISTOGRAM = '''
+SELECT users.username, COUNT(issues.id) as cnt
+FROM users LEFT JOIN issues ON users.id = issues.user_id
+GROUP BY users.username
+HAVING cnt>0
+'''
+# each side groups by its own month expression so it walks
+# idx_issues_issue_month / idx_issues_return_month; the outer GROUP BY only
+# merges one row per month from each side
+SQL_ISSUE_RETURN_COMPARISON = '''
+SELECT m, SUM(issued) as issued, SUM(returned) as returned
+FROM (SELECT substr(issue_date,1,7) as m, COUNT(*) as issued, 0 as returned
+      FROM issues GROUP BY substr(issue_date,1,7)
+      UNION ALL
+      SELECT substr(return_date,1,7), 0, COUNT(*)
+      FROM issues WHERE return_date IS NOT NULL GROUP BY substr(return_date,1,7))
+GROUP BY m ORDER BY m
+'''
+SQL_DASHBOARD_COUNTS = '''
+SELECT (SELECT COUNT(*) FROM books),
+       (SELECT COUNT(*) FROM books WHERE status='Issued'),
+       (SELECT COUNT(*) FROM users)
+'''
+# delete_book leaves its issue rows behind, so orphans are filtered out
+# before LIMIT 5 rather than dropped by the JOIN afterwards
+SQL_TOP5_BOOKS = '''
+SELECT books.id, books.title, books.author, t.cnt as times_issued
+FROM (SELECT book_id, COUNT(*) as cnt FROM issues
+      WHERE book_id IN (SELECT id FROM books)
+      GROUP BY book_id ORDER BY cnt DESC, book_id LIMIT 5) t
+JOIN books ON books.id = t.book_id
+ORDER BY t.cnt DESC, books.id
+'''
+SQL_CATEGORY_ISSUE_COUNTS = '''
+SELECT books.category, COUNT(issues.id) as issued_count
+FROM books JOIN issues ON books.id = issues.book_id
+GROUP BY books.category
+'''
+# list_my_issued_books pages by keyset on (issue_date, id): each page is one
+# range of idx_issues_user_date_id, with no sort step and no OFFSET skipping
+SQL_MY_ISSUED_FIRST = '''
+SELECT issues.id as issue_id, books.id as book_id, books.title, issues.issue_date, issues.return_date, issues.returned
+FROM issues JOIN books ON books.id = issues.book_id
+WHERE issues.user_id=?
+ORDER BY issues.issue_date DESC, issues.id DESC
+LIMIT ?
+'''
+SQL_MY_ISSUED_NEXT = '''
+SELECT issues.id as issue_id, books.id as book_id, books.title, issues.issue_date, issues.return_date, issues.returned
+FROM issues JOIN books ON books.id = issues.book_id
+WHERE issues.user_id=? AND (issues.issue_date, issues.id) < (?, ?)
+ORDER BY issues.issue_date DESC, issues.id DESC
+LIMIT ?
+'''
+SQL_MY_ISSUED_TOTALS = '''
+SELECT COUNT(CASE WHEN returned=0 THEN 1 END),
+       COUNT(CASE WHEN returned=0 AND return_date < date('now','localtime') THEN 1 END)
+FROM issues WHERE user_id=?
+'''
+# rows per page in list_my_issued_books
+MY_ISSUED_PAGE_SIZE = 50
+
 # ---------------------- Utility Functions ----------------------
 
 def hash_password(password: str) -> str:
     return hashlib.sha256(password.encode('utf-8')).hexdigest()
 
 
+# Hash of the default admin password, computed once for seeding and resets
+_ADMIN_HASH = hash_password('admin123')
+
+
+# Accepted values for free-text answers; set membership instead of chained
+# comparisons or a regex
+_ROLES = frozenset(('admin', 'user'))
+_BOOK_STATUSES = frozenset(('Available', 'Issued'))
+
+
 def input_nonempty(prompt: str) -> str:
     while True:
         v = input(prompt).strip()
@@ -51,16 +192,95 @@ def pause():
     input('Press Enter to continue...')
 
 
+def _enable_vt_mode():
+    """Turn on ANSI escape handling in a Windows console; True on success."""
+    try:
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.GetStdHandle(-11)  # STD_OUTPUT_HANDLE
+        mode = ctypes.c_uint32()
+        if not kernel32.GetConsoleMode(handle, ctypes.byref(mode)):
+            return False
+        # ENABLE_VIRTUAL_TERMINAL_PROCESSING
+        return bool(kernel32.SetConsoleMode(handle, mode.value | 0x0004))
+    except Exception:
+        return False
+
+
+# ANSI clear + cursor-home; writing it replaces forking cls/clear on every
+# redraw. Left empty when stdout is not a terminal so piped output stays clean.
+# A Windows console that cannot take escape codes falls back to cls.
+_CLS_FALLBACK = False
+if not sys.stdout.isatty():
+    CLEAR_SCREEN = ''
+elif os.name != 'nt' or _enable_vt_mode():
+    CLEAR_SCREEN = '\x1b[2J\x1b[H'
+else:
+    CLEAR_SCREEN = ''
+    _CLS_FALLBACK = True
+
+
+def _redraw(menu):
+    """Clear the screen and print a menu."""
+    if _CLS_FALLBACK:
+        os.system('cls')
+    sys.stdout.write(CLEAR_SCREEN + menu)
+
+
+# Analytics query results, keyed by name. Any function that changes
+# books/users/issues calls _invalidate_analytics() so stale charts are never
+# drawn.
+_ANALYTICS_CACHE = {}
+
+
+def _invalidate_analytics():
+    _ANALYTICS_CACHE.clear()
+
+
+def _cached_rows(conn, name, sql):
+    rows = _ANALYTICS_CACHE.get(name)
+    if rows is None:
+        rows = conn.execute(sql).fetchall()
+        _ANALYTICS_CACHE[name] = rows
+    return rows
+
+
 # ---------------------- Database Initialization ----------------------
 
+# The one connection shared by the whole session; see get_connection().
+# Nothing else may open the library database: the menus assert they were
+# handed this object (skipped under python -O). backup_database and
+# restore_database only open the backup file itself.
+_CONN = None
+
+
 def get_connection():
-    conn = sqlite3.connect(DB_FILE)
+    """Return the session's connection, opening it on first use."""
+    global _CONN
+    if _CONN is not None:
+        return _CONN
+    conn = sqlite3.connect(DB_FILE, cached_statements=256)
     conn.row_factory = sqlite3.Row
+    # only takes effect on a new, empty file, so it has to run before WAL is
+    # switched on and before create_tables writes the schema
+    conn.execute('PRAGMA page_size=4096')
+    # WAL + synchronous=NORMAL: readers don't block the writer and commits
+    # skip the extra fsync of the rollback journal. journal_mode is persistent,
+    # so this also leaves the file itself in WAL mode.
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute('PRAGMA cache_size=-20000')
+    conn.execute('PRAGMA mmap_size=268435456')
+    _CONN = conn
     return conn
 
 
 def create_tables(conn: sqlite3.Connection):
     c = conn.cursor()
+    # sqlite3 does not open a transaction for DDL by itself, so without this
+    # every CREATE below would be committed (and synced) on its own
+    c.execute('BEGIN')
     c.execute('''
     CREATE TABLE IF NOT EXISTS users (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -93,75 +313,89 @@ def create_tables(conn: sqlite3.Connection):
         FOREIGN KEY(user_id) REFERENCES users(id)
     )
     ''')
+
+    # indexes for the joins, filters and GROUP BYs used by listings and analytics
+    c.execute('CREATE INDEX IF NOT EXISTS idx_issues_book ON issues(book_id)')
+    # per-user history is read newest first, paged on (issue_date, id); this
+    # index supersedes the older idx_issues_user and idx_issues_user_date
+    c.execute('DROP INDEX IF EXISTS idx_issues_user')
+    c.execute('DROP INDEX IF EXISTS idx_issues_user_date')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_issues_user_date_id ON issues(user_id, issue_date DESC, id DESC)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_issues_returned_date ON issues(returned, issue_date)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_issues_return_date ON issues(return_date)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_books_status ON books(status)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_books_category ON books(category)')
+    # expression indexes matching the monthly analytics GROUP BYs, so SQLite
+    # walks months in order instead of building a temp b-tree per query
+    c.execute('CREATE INDEX IF NOT EXISTS idx_issues_issue_month ON issues(substr(issue_date,1,7))')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_issues_return_month ON issues(substr(return_date,1,7))')
     conn.commit()
 
 
+def _demo_issues(book_ids, user_ids):
+    # yields one issue row per book so executemany binds them as it goes
+    today = datetime.date.today()
+    for i, book_id in enumerate(book_ids):
+        user_id = user_ids[i % len(user_ids)]
+        issue_date = (today - datetime.timedelta(days=2 + i)).strftime(DATEFMT)
+        return_date = (today + datetime.timedelta(days=14 - i)).strftime(DATEFMT)
+        yield (book_id, user_id, issue_date, return_date)
+
+
 def seed_demo_data(conn: sqlite3.Connection):
-    c = conn.cursor()
-    c.execute('SELECT COUNT(*) FROM users')
-    user_count = c.fetchone()[0]
-    if user_count == 0:
-        now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        users = [
-            ('admin', hash_password('admin123'), 'admin', now),
-            ('user1', hash_password('pass1'), 'user', now),
-            ('user2', hash_password('pass2'), 'user', now),
-            ('user3', hash_password('pass3'), 'user', now),
-            ('user4', hash_password('pass4'), 'user', now),
-            ('user5', hash_password('pass5'), 'user', now),
-        ]
-        c.executemany('INSERT INTO users (username,password,role,created_at) VALUES (?,?,?,?)', users)
-        conn.commit()
-        print('Seeded users (including default admin: admin/admin123)')
-
-    c.execute('SELECT COUNT(*) FROM books')
-    book_count = c.fetchone()[0]
-    if book_count == 0:
-        sample_books = [
-            ('To Kill a Mockingbird', 'Harper Lee', 'Fiction'),
-            ('1984', 'George Orwell', 'Fiction'),
-            ('A Brief History of Time', 'Stephen Hawking', 'Science'),
-            ('The Selfish Gene', 'Richard Dawkins', 'Science'),
-            ('The Alchemist', 'Paulo Coelho', 'Fiction'),
-            ('Clean Code', 'Robert C. Martin', 'Programming'),
-            ('Introduction to Algorithms', 'Cormen et al.', 'Programming'),
-            ('Principles of Economics', 'Mankiw', 'Economics'),
-            ('Indian Polity', 'Laxmikanth', 'Political Science'),
-            ('Art of War', 'Sun Tzu', 'Philosophy'),
-            ('The Odyssey', 'Homer', 'Classic'),
-            ('Hamlet', 'William Shakespeare', 'Classic'),
-            ('The Great Gatsby', 'F. Scott Fitzgerald', 'Fiction'),
-            ('Sapiens', 'Yuval Noah Harari', 'History'),
-            ('Guns, Germs, and Steel', 'Jared Diamond', 'History'),
-            ('The Pragmatic Programmer', 'Andrew Hunt', 'Programming'),
-            ('Computer Networks', 'Tanenbaum', 'Programming'),
-            ('Data Science from Scratch', 'Joel Grus', 'Programming'),
-            ('The Road', 'Cormac McCarthy', 'Fiction'),
-            ('The Catcher in the Rye', 'J.D. Salinger', 'Fiction'),
-        ]
-        c.executemany('INSERT INTO books (title,author,category,status) VALUES (?,?,?,?)', [(t,a,cate,'Available') for (t,a,cate) in sample_books])
-        conn.commit()
-        print('Seeded 20 sample books')
-
-    c.execute('SELECT COUNT(*) FROM issues')
-    issue_count = c.fetchone()[0]
-    if issue_count == 0:
-        c.execute('SELECT id FROM books LIMIT 9')
-        book_ids = [row['id'] for row in c.fetchall()]
-        c.execute("SELECT id FROM users WHERE role='user'")
-        user_ids = [row['id'] for row in c.fetchall()]
-        if len(user_ids) > 0 and len(book_ids) > 0:
-            today = datetime.date.today()
-            issues = []
-            for i, book_id in enumerate(book_ids):
-                user_id = user_ids[i % len(user_ids)]
-                issue_date = (today - datetime.timedelta(days=2 + i)).strftime(DATEFMT)
-                return_date = (today + datetime.timedelta(days=14 - i)).strftime(DATEFMT)
-                issues.append((book_id, user_id, issue_date, return_date, 0))
-            c.executemany('INSERT INTO issues (book_id,user_id,issue_date,return_date,returned) VALUES (?,?,?,?,?)', issues)
-            c.executemany('UPDATE books SET status="Issued" WHERE id=?', [(bid,) for bid in book_ids])
-            conn.commit()
-            print('Seeded 9 issued books')
+    # one transaction for the whole seed: a single commit instead of one per table
+    with conn:
+        user_count = conn.execute(SQL_COUNT_USERS).fetchone()[0]
+        if user_count == 0:
+            now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            users = [
+                ('admin', _ADMIN_HASH, 'admin', now),
+                ('user1', hash_password('pass1'), 'user', now),
+                ('user2', hash_password('pass2'), 'user', now),
+                ('user3', hash_password('pass3'), 'user', now),
+                ('user4', hash_password('pass4'), 'user', now),
+                ('user5', hash_password('pass5'), 'user', now),
+            ]
+            conn.executemany(SQL_INSERT_USER, users)
+            print('Seeded users (including default admin: admin/admin123)')
+
+        book_count = conn.execute(SQL_COUNT_BOOKS).fetchone()[0]
+        if book_count == 0:
+            sample_books = [
+                ('To Kill a Mockingbird', 'Harper Lee', 'Fiction'),
+                ('1984', 'George Orwell', 'Fiction'),
+                ('A Brief History of Time', 'Stephen Hawking', 'Science'),
+                ('The Selfish Gene', 'Richard Dawkins', 'Science'),
+                ('The Alchemist', 'Paulo Coelho', 'Fiction'),
+                ('Clean Code', 'Robert C. Martin', 'Programming'),
+                ('Introduction to Algorithms', 'Cormen et al.', 'Programming'),
+                ('Principles of Economics', 'Mankiw', 'Economics'),
+                ('Indian Polity', 'Laxmikanth', 'Political Science'),
+                ('Art of War', 'Sun Tzu', 'Philosophy'),
+                ('The Odyssey', 'Homer', 'Classic'),
+                ('Hamlet', 'William Shakespeare', 'Classic'),
+                ('The Great Gatsby', 'F. Scott Fitzgerald', 'Fiction'),
+                ('Sapiens', 'Yuval Noah Harari', 'History'),
+                ('Guns, Germs, and Steel', 'Jared Diamond', 'History'),
+                ('The Pragmatic Programmer', 'Andrew Hunt', 'Programming'),
+                ('Computer Networks', 'Tanenbaum', 'Programming'),
+                ('Data Science from Scratch', 'Joel Grus', 'Programming'),
+                ('The Road', 'Cormac McCarthy', 'Fiction'),
+                ('The Catcher in the Rye', 'J.D. Salinger', 'Fiction'),
+            ]
+            conn.executemany(SQL_INSERT_BOOK, sample_books)
+            print('Seeded 20 sample books')
+
+        issue_count = conn.execute(SQL_COUNT_ISSUES).fetchone()[0]
+        if issue_count == 0:
+            book_ids = [row[0] for row in conn.execute(SQL_SEED_BOOK_IDS)]
+            user_ids = [row[0] for row in conn.execute(SQL_SEED_USER_IDS)]
+            if len(user_ids) > 0 and len(book_ids) > 0:
+                conn.executemany(SQL_INSERT_ISSUE, _demo_issues(book_ids, user_ids))
+                # one set-based UPDATE, inside the same seed transaction as the
+                # issue rows it reads from
+                conn.execute(SQL_SEED_MARK_ISSUED)
+                print('Seeded 9 issued books')
 
 
 def initialize_database():
@@ -169,82 +403,88 @@ def initialize_database():
     conn = get_connection()
     create_tables(conn)
     seed_demo_data(conn)
-    conn.close()
     if first_time:
         print('Database created: {}'.format(DB_FILE))
+    # keep the connection open for the whole session so the page cache and
+    # prepared statements stay warm between menu actions
+    return conn
 
 
 # ---------------------- User Management ----------------------
 
+# Credential rows by (connection, username), so repeat logins in a session
+# skip the query. Every function that writes to users calls
+# _user_row.cache_clear().
+@lru_cache(maxsize=256)
+def _user_row(conn, username):
+    return conn.execute(SQL_AUTHENTICATE, (username,)).fetchone()
+
+
 def reset_admin_password(conn):
     """Reset admin password to admin123 (hashed)."""
-    c = conn.cursor()
-    new_pass = "admin123"
-    hashed = hash_password(new_pass)
-    c.execute("UPDATE users SET password=? WHERE username='admin'", (hashed,))
-    conn.commit()
+    with conn:
+        conn.execute(SQL_UPDATE_PASSWORD_BY_NAME, (_ADMIN_HASH, 'admin'))
+    _user_row.cache_clear()
     print("Admin password has been reset to: admin123 (SHA-256 protected)")
 
 
 def reset_user_password(conn):
     """Admin can reset ANY user's password to a new chosen password."""
-    c = conn.cursor()
     username = input_nonempty("Enter the username to reset password: ")
-    c.execute("SELECT * FROM users WHERE username=?", (username,))
-    user = c.fetchone()
+    user = conn.execute(SQL_SELECT_USER_BY_NAME, (username,)).fetchone()
     if not user:
         print("User does not exist.")
         return
     new_pass = input_nonempty("Enter new password for user: ")
     hashed = hash_password(new_pass)
-    c.execute("UPDATE users SET password=? WHERE username=?", (hashed, username))
-    conn.commit()
+    with conn:
+        conn.execute(SQL_UPDATE_PASSWORD_BY_NAME, (hashed, username))
+    _user_row.cache_clear()
     print(f"Password for user '{username}' has been reset successfully.")
 
 
 def create_user(conn: sqlite3.Connection, username: str, password: str, role: str = 'user'):
     try:
         now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        c = conn.cursor()
-        c.execute('INSERT INTO users (username,password,role,created_at) VALUES (?,?,?,?)', (username, hash_password(password), role, now))
-        conn.commit()
+        with conn:
+            conn.execute(SQL_INSERT_USER, (username, hash_password(password), role, now))
+        _invalidate_analytics()
+        _user_row.cache_clear()
         print('User created:', username)
     except sqlite3.IntegrityError:
         print('Error: Username already exists.')
 
 
 def update_user(conn: sqlite3.Connection, user_id: int, new_username: str = None, new_role: str = None):
-    c = conn.cursor()
-    updates = []
-    params = []
-    if new_username:
-        updates.append('username=?')
-        params.append(new_username)
-    if new_role:
-        updates.append('role=?')
-        params.append(new_role)
-    if not updates:
+    # one fixed statement per call shape, so each hits the statement cache
+    if new_username and new_role:
+        sql, params = SQL_UPDATE_USERNAME_ROLE, (new_username, new_role, user_id)
+    elif new_username:
+        sql, params = SQL_UPDATE_USERNAME, (new_username, user_id)
+    elif new_role:
+        sql, params = SQL_UPDATE_ROLE, (new_role, user_id)
+    else:
         print('Nothing to update.')
         return
-    params.append(user_id)
-    sql = 'UPDATE users SET ' + ','.join(updates) + ' WHERE id=?'
     try:
-        c.execute(sql, params)
-        conn.commit()
+        with conn:
+            conn.execute(sql, params)
+        _invalidate_analytics()
+        _user_row.cache_clear()
         print('User updated.')
     except sqlite3.IntegrityError:
         print('Error: Username may already exist.')
 
 
 def delete_user(conn: sqlite3.Connection, user_id: int):
-    c = conn.cursor()
-    c.execute('DELETE FROM users WHERE id=?', (user_id,))
-    conn.commit()
+    with conn:
+        conn.execute(SQL_DELETE_USER, (user_id,))
+    _invalidate_analytics()
+    _user_row.cache_clear()
     print('User deleted (if existed).')
 
 
 def change_password(conn: sqlite3.Connection, user_id: int):
-    c = conn.cursor()
     while True:
         pwd = getpass.getpass('Enter new password: ').strip()
         if not pwd:
@@ -254,8 +494,9 @@ def change_password(conn: sqlite3.Connection, user_id: int):
         if pwd != pwd2:
             print('Passwords do not match.')
             continue
-        c.execute('UPDATE users SET password=? WHERE id=?', (hash_password(pwd), user_id))
-        conn.commit()
+        with conn:
+            conn.execute(SQL_UPDATE_PASSWORD, (hash_password(pwd), user_id))
+        _user_row.cache_clear()
         print('Password changed successfully.')
         break
 
@@ -266,9 +507,9 @@ def add_book(conn: sqlite3.Connection):
     title = input_nonempty('Title: ')
     author = input_nonempty('Author: ')
     category = input_nonempty('Category: ')
-    c = conn.cursor()
-    c.execute('INSERT INTO books (title,author,category,status) VALUES (?,?,?,"Available")', (title, author, category))
-    conn.commit()
+    with conn:
+        conn.execute(SQL_INSERT_BOOK, (title, author, category))
+    _invalidate_analytics()
     print('Book added.')
 
 
@@ -278,9 +519,7 @@ def update_book(conn: sqlite3.Connection):
         print('Invalid ID.')
         return
     book_id = int(book_id)
-    c = conn.cursor()
-    c.execute('SELECT * FROM books WHERE id=?', (book_id,))
-    row = c.fetchone()
+    row = conn.execute(SQL_SELECT_BOOK, (book_id,)).fetchone()
     if not row:
         print('Book not found.')
         return
@@ -289,11 +528,12 @@ def update_book(conn: sqlite3.Connection):
     author = input('Author [{}]: '.format(row['author'])).strip() or row['author']
     category = input('Category [{}]: '.format(row['category'])).strip() or row['category']
     status = input('Status (Available/Issued) [{}]: '.format(row['status'])).strip() or row['status']
-    if status not in ('Available', 'Issued'):
+    if status not in _BOOK_STATUSES:
         print('Invalid status. Keeping existing.')
         status = row['status']
-    c.execute('UPDATE books SET title=?,author=?,category=?,status=? WHERE id=?', (title,author,category,status,book_id))
-    conn.commit()
+    with conn:
+        conn.execute(SQL_UPDATE_BOOK, (title,author,category,status,book_id))
+    _invalidate_analytics()
     print('Book updated.')
 
 
@@ -303,9 +543,9 @@ def delete_book(conn: sqlite3.Connection):
         print('Invalid ID.')
         return
     book_id = int(book_id)
-    c = conn.cursor()
-    c.execute('DELETE FROM books WHERE id=?', (book_id,))
-    conn.commit()
+    with conn:
+        conn.execute(SQL_DELETE_BOOK, (book_id,))
+    _invalidate_analytics()
     print('Book deleted (if existed).')
 
 
@@ -317,9 +557,7 @@ def issue_book(conn: sqlite3.Connection):
         print('Invalid ID.')
         return
     book_id = int(book_id)
-    c = conn.cursor()
-    c.execute('SELECT * FROM books WHERE id=?', (book_id,))
-    book = c.fetchone()
+    book = conn.execute(SQL_SELECT_BOOK, (book_id,)).fetchone()
     if not book:
         print('Book not found.')
         return
@@ -331,19 +569,30 @@ def issue_book(conn: sqlite3.Connection):
         print('Invalid user ID.')
         return
     user_id = int(user_id)
-    c.execute('SELECT * FROM users WHERE id=?', (user_id,))
-    user = c.fetchone()
+    user = conn.execute(SQL_SELECT_USER, (user_id,)).fetchone()
     if not user:
         print('User not found.')
         return
-    issue_date = input('Issue Date (YYYY-MM-DD) [today]: ').strip() or datetime.date.today().strftime(DATEFMT)
+    issue_date = input('Issue Date (YYYY-MM-DD) [today]: ').strip()
     return_date = input('Return Date (YYYY-MM-DD) [2 weeks from issue]: ').strip()
-    if not return_date:
-        dt_issue = datetime.datetime.strptime(issue_date, DATEFMT).date()
-        return_date = (dt_issue + datetime.timedelta(days=14)).strftime(DATEFMT)
-    c.execute('INSERT INTO issues (book_id,user_id,issue_date,return_date,returned) VALUES (?,?,?,?,0)', (book_id, user_id, issue_date, return_date))
-    c.execute('UPDATE books SET status="Issued" WHERE id=?', (book_id,))
-    conn.commit()
+    # fromisoformat also accepts forms like 20261015 or 2026-W42-1, so store
+    # the re-formatted date, never the raw input
+    try:
+        dt_issue = datetime.date.fromisoformat(issue_date) if issue_date else datetime.date.today()
+        if return_date:
+            dt_return = datetime.date.fromisoformat(return_date)
+        else:
+            dt_return = dt_issue + datetime.timedelta(days=14)
+    except ValueError:
+        print('Invalid date, expected YYYY-MM-DD.')
+        return
+    issue_date = dt_issue.strftime(DATEFMT)
+    return_date = dt_return.strftime(DATEFMT)
+    # the issue row and the book status change commit together or not at all
+    with conn:
+        conn.execute(SQL_INSERT_ISSUE, (book_id, user_id, issue_date, return_date))
+        conn.execute(SQL_UPDATE_BOOK_STATUS_ISSUED, (book_id,))
+    _invalidate_analytics()
     print('Book issued successfully.')
 
 
@@ -353,112 +602,145 @@ def return_book(conn: sqlite3.Connection):
         print('Invalid issue ID.')
         return
     issue_id = int(issue_id)
-    c = conn.cursor()
-    c.execute('SELECT * FROM issues WHERE id=?', (issue_id,))
-    issue = c.fetchone()
+    issue = conn.execute(SQL_SELECT_ISSUE, (issue_id,)).fetchone()
     if not issue:
         print('Issue record not found.')
         return
     if issue['returned']:
         print('Book already returned.')
         return
-    c.execute('UPDATE issues SET returned=1 WHERE id=?', (issue_id,))
-    c.execute('UPDATE books SET status="Available" WHERE id=?', (issue['book_id'],))
-    conn.commit()
+    with conn:
+        conn.execute(SQL_MARK_ISSUE_RETURNED, (issue_id,))
+        conn.execute(SQL_UPDATE_BOOK_STATUS_AVAILABLE, (issue['book_id'],))
+    _invalidate_analytics()
     print('Book returned successfully.')
 
 
+def run_batch(conn: sqlite3.Connection, path: str) -> bool:
+    """Apply ISSUE/RETURN commands from a file in a single transaction.
+
+    Each line is `ISSUE <user_id> <book_id>` or `RETURN <issue_id>`; blank
+    lines and lines starting with # are skipped. All RETURN lines are applied
+    before all ISSUE lines, whatever their order in the file. Every line is
+    checked first, and if any fails nothing is written.
+    """
+    books = dict(conn.execute(SQL_BOOK_STATUSES).fetchall())
+    users = {r[0] for r in conn.execute(SQL_USER_IDS)}
+    open_issues = dict(conn.execute(SQL_OPEN_ISSUES).fetchall())
+    today = datetime.date.today()
+    issue_date = today.strftime(DATEFMT)
+    return_date = (today + datetime.timedelta(days=14)).strftime(DATEFMT)
+    # parse everything first; RETURN lines are then checked before ISSUE
+    # lines, the same order the writes are applied in below
+    issue_lines, return_lines, errors = [], [], []
+    with open(path, encoding='utf-8') as f:
+        for n, line in enumerate(f, 1):
+            parts = line.split()
+            if not parts or parts[0].startswith('#'):
+                continue
+            cmd = parts[0].upper()
+            # isdecimal, not isdigit: int() rejects digits such as '²'
+            if cmd == 'ISSUE' and len(parts) == 3 and parts[1].isdecimal() and parts[2].isdecimal():
+                issue_lines.append((n, int(parts[1]), int(parts[2])))
+            elif cmd == 'RETURN' and len(parts) == 2 and parts[1].isdecimal():
+                return_lines.append((n, int(parts[1])))
+            else:
+                errors.append((n, 'expected "ISSUE <user_id> <book_id>" or "RETURN <issue_id>"'))
+    returns = []
+    for n, issue_id in return_lines:
+        # popped, so a second RETURN of the same issue is rejected
+        book_id = open_issues.pop(issue_id, None)
+        if book_id is None:
+            errors.append((n, 'issue {} not found or already returned'.format(issue_id)))
+        else:
+            books[book_id] = 'Available'
+            returns.append((issue_id, book_id))
+    issues = []
+    for n, user_id, book_id in issue_lines:
+        if user_id not in users:
+            errors.append((n, 'user {} not found'.format(user_id)))
+        elif book_id not in books:
+            errors.append((n, 'book {} not found'.format(book_id)))
+        elif books[book_id] == 'Issued':
+            errors.append((n, 'book {} is already issued'.format(book_id)))
+        else:
+            books[book_id] = 'Issued'
+            issues.append((book_id, user_id, issue_date, return_date))
+    if errors:
+        print('\n'.join('line {}: {}'.format(n, msg) for n, msg in sorted(errors)))
+        print('Batch aborted, nothing was written.')
+        return False
+    # returns can only name issues that already exist, so applying them first
+    # frees their books before any ISSUE line in the same file takes them
+    with conn:
+        conn.executemany(SQL_MARK_ISSUE_RETURNED, [(i,) for i, _ in returns])
+        conn.executemany(SQL_UPDATE_BOOK_STATUS_AVAILABLE, [(b,) for _, b in returns])
+        conn.executemany(SQL_INSERT_ISSUE, issues)
+        conn.executemany(SQL_UPDATE_BOOK_STATUS_ISSUED, [(i[0],) for i in issues])
+    _invalidate_analytics()
+    print('Batch applied: {} issued, {} returned.'.format(len(issues), len(returns)))
+    return True
+
+
 def list_issued_books(conn: sqlite3.Connection):
-    c = conn.cursor()
-    c.execute('''
-    SELECT issues.id as issue_id, books.id as book_id, books.title, users.username, issues.issue_date, issues.return_date, issues.returned
-    FROM issues
-    JOIN books ON books.id = issues.book_id
-    JOIN users ON users.id = issues.user_id
-    WHERE issues.returned=0
-    ORDER BY issues.issue_date DESC
-    ''')
-    rows = c.fetchall()
-    if not rows:
-        print('No currently issued books.')
-        return
+    c = conn.execute(SQL_LIST_ISSUED)
     headers = ['IssueID','BookID','Title','IssuedTo','IssueDate','ReturnDate','Returned']
-    data = [[r['issue_id'], r['book_id'], r['title'], r['username'], r['issue_date'], r['return_date'], r['returned']] for r in rows]
-    print_table(data, headers)
+    if not print_table_stream(c, headers):
+        print('No currently issued books.')
 
 
 # ---------------------- Search & Filter ----------------------
 
+# search_books: menu choice -> (prompt, LIKE query)
+_SEARCH_FIELDS = {
+    '1': ('Title contains: ', SQL_SEARCH_TITLE),
+    '2': ('Author contains: ', SQL_SEARCH_AUTHOR),
+    '3': ('Category: ', SQL_SEARCH_CATEGORY),
+}
+
+# filter_by_status: menu choice -> books.status value
+_STATUS_CHOICES = {'1': 'Available', '2': 'Issued'}
+
+
 def search_books(conn: sqlite3.Connection):
     print('Search by: 1) Title 2) Author 3) Category 4) Show All')
     choice = input_nonempty('Choice: ')
-    c = conn.cursor()
-    if choice == '1':
-        q = input_nonempty('Title contains: ')
-        c.execute('SELECT * FROM books WHERE title LIKE ?', ('%'+q+'%',))
-    elif choice == '2':
-        q = input_nonempty('Author contains: ')
-        c.execute('SELECT * FROM books WHERE author LIKE ?', ('%'+q+'%',))
-    elif choice == '3':
-        q = input_nonempty('Category: ')
-        c.execute('SELECT * FROM books WHERE category LIKE ?', ('%'+q+'%',))
+    if choice in _SEARCH_FIELDS:
+        prompt, sql = _SEARCH_FIELDS[choice]
+        q = input_nonempty(prompt)
+        c = conn.execute(sql, ('%'+q+'%',))
     elif choice == '4':
-        c.execute('SELECT * FROM books')
+        c = conn.execute(SQL_LIST_BOOKS)
     else:
         print('Invalid choice.')
         return
-    rows = c.fetchall()
-    if not rows:
-        print('No books found.')
-        return
     headers = ['ID','Title','Author','Category','Status']
-    data = [[r['id'], r['title'], r['author'], r['category'], r['status']] for r in rows]
-    print_table(data, headers)
+    if not print_table_stream(c, headers):
+        print('No books found.')
 
 
 def filter_by_status(conn: sqlite3.Connection):
     print('Filter by: 1) Available 2) Issued')
-    choice = input_nonempty('Choice: ')
-    if choice == '1':
-        status = 'Available'
-    elif choice == '2':
-        status = 'Issued'
-    else:
+    status = _STATUS_CHOICES.get(input_nonempty('Choice: '))
+    if status is None:
         print('Invalid choice.')
         return
-    c = conn.cursor()
-    c.execute('SELECT * FROM books WHERE status=?', (status,))
-    rows = c.fetchall()
-    if not rows:
-        print('No books found for status', status)
-        return
+    c = conn.execute(SQL_BOOKS_BY_STATUS, (status,))
     headers = ['ID','Title','Author','Category','Status']
-    data = [[r['id'], r['title'], r['author'], r['category'], r['status']] for r in rows]
-    print_table(data, headers)
+    if not print_table_stream(c, headers):
+        print('No books found for status', status)
 
 
 # ---------------------- Dashboard & Analytics ----------------------
 
 def analytics_menu(conn):
+    assert conn is _CONN, 'menus must share the session connection'
     while True:
-        print('===== ADVANCED ANALYTICS MENU =====')
-        print('1) Monthly Issues Trend (Line Chart)')
-        print('2) Monthly Returns Trend (Line Chart)')
-        print('3) Category-wise Availability (Bar Chart)')
-        print('4) User-wise Issue Frequency (Histogram)')
-        print('5) Issued vs Returned Comparative Trend (Double Line Chart)')
-        print('6) Back to Dashboard')
+        sys.stdout.write(ANALYTICS_MENU)
         choice = input_nonempty('Enter choice: ')
-        if choice == '1':
-            show_monthly_issues(conn)
-        elif choice == '2':
-            show_monthly_returns(conn)
-        elif choice == '3':
-            show_category_availability(conn)
-        elif choice == '4':
-            show_user_issue_histogram(conn)
-        elif choice == '5':
-            show_issue_return_comparison(conn)
+        fn = _ANALYTICS_HANDLERS.get(choice)
+        if fn:
+            fn(conn)
         elif choice == '6':
             return
         else:
@@ -469,9 +751,7 @@ def show_monthly_issues(conn):
     if plt is None:
         print('matplotlib not installed.')
         return
-    c = conn.cursor()
-    c.execute("SELECT substr(issue_date,1,7) AS month, COUNT(*) FROM issues GROUP BY month ORDER BY month")
-    rows = c.fetchall()
+    rows = _cached_rows(conn, 'monthly_issues', SQL_MONTHLY_ISSUES)
     if not rows:
         print('No issue data available.')
         return
@@ -491,9 +771,7 @@ def show_monthly_returns(conn):
     if plt is None:
         print('matplotlib not installed.')
         return
-    c = conn.cursor()
-    c.execute("SELECT substr(return_date,1,7) AS month, COUNT(*) FROM issues WHERE return_date IS NOT NULL GROUP BY month ORDER BY month")
-    rows = c.fetchall()
+    rows = _cached_rows(conn, 'monthly_returns', SQL_MONTHLY_RETURNS)
     if not rows:
         print('No returns data available.')
         return
@@ -513,9 +791,7 @@ def show_category_availability(conn):
     if plt is None:
         print('matplotlib not installed.')
         return
-    c = conn.cursor()
-    c.execute("SELECT category, COUNT(*) FROM books WHERE status='Available' GROUP BY category")
-    rows = c.fetchall()
+    rows = _cached_rows(conn, 'category_availability', SQL_CATEGORY_AVAILABILITY)
     if not rows:
         print('No availability data available.')
         return
@@ -535,20 +811,18 @@ def show_user_issue_histogram(conn):
     if plt is None:
         print('matplotlib not installed.')
         return
-    c = conn.cursor()
     # user names for histogram
-    c.execute('''
-        SELECT users.username, COUNT(issues.id) as cnt
-        FROM users LEFT JOIN issues ON users.id = issues.user_id
-        GROUP BY users.username
-        HAVING cnt>0
-    ''')
-    rows = c.fetchall()
+    rows = _cached_rows(conn, 'user_issue_histogram', SQL_USER_ISSUE_HISTOGRAM)
     if not rows:
         print('No user issue data available.')
         return
-    users = [r[0] for r in rows]
-    counts = [r[1] for r in rows]
+    if np is not None:
+        # hand matplotlib ready-made arrays instead of Python lists
+        users = np.array([r[0] for r in rows])
+        counts = np.fromiter((r[1] for r in rows), dtype=np.int64, count=len(rows))
+    else:
+        users = [r[0] for r in rows]
+        counts = [r[1] for r in rows]
     plt.figure()
     plt.bar(users, counts)
     plt.title('User-wise Issue Frequency')
@@ -563,16 +837,14 @@ def show_issue_return_comparison(conn):
     if plt is None:
         print('matplotlib not installed.')
         return
-    c = conn.cursor()
-    c.execute("SELECT substr(issue_date,1,7) as m, COUNT(*) FROM issues GROUP BY m ORDER BY m")
-    issue_rows = c.fetchall()
-    c.execute("SELECT substr(return_date,1,7) as m, COUNT(*) FROM issues WHERE return_date IS NOT NULL GROUP BY m ORDER BY m")
-    return_rows = c.fetchall()
-    months = sorted(list({r[0] for r in issue_rows} | {r[0] for r in return_rows}))
-    issue_map = {r[0]: r[1] for r in issue_rows}
-    return_map = {r[0]: r[1] for r in return_rows}
-    issues_counts = [issue_map.get(m, 0) for m in months]
-    returns_counts = [return_map.get(m, 0) for m in months]
+    rows = _cached_rows(conn, 'issue_return_comparison', SQL_ISSUE_RETURN_COMPARISON)
+    months = []
+    issues_counts = []
+    returns_counts = []
+    for r in rows:
+        months.append(r[0])
+        issues_counts.append(r[1])
+        returns_counts.append(r[2])
     plt.figure()
     plt.plot(months, issues_counts, marker='o', label='Issued Books')
     plt.plot(months, returns_counts, marker='o', label='Returned Books')
@@ -591,14 +863,8 @@ def show_graphical_analytics(conn):
 
 
 def show_dashboard(conn: sqlite3.Connection):
-    c = conn.cursor()
-    c.execute('SELECT COUNT(*) FROM books')
-    total_books = c.fetchone()[0]
-    c.execute("SELECT COUNT(*) FROM books WHERE status='Issued'")
-    issued_books = c.fetchone()[0]
+    total_books, issued_books, total_users = conn.execute(SQL_DASHBOARD_COUNTS).fetchone()
     available_books = total_books - issued_books
-    c.execute('SELECT COUNT(*) FROM users')
-    total_users = c.fetchone()[0]
 
     print('Summary Statistics:')
     print('Total Books:', total_books)
@@ -606,35 +872,23 @@ def show_dashboard(conn: sqlite3.Connection):
     print('Available Books:', available_books)
     print('Total Users:', total_users)
 
-    c.execute('''
-    SELECT books.id, books.title, books.author, COUNT(issues.id) as times_issued
-    FROM books LEFT JOIN issues ON books.id = issues.book_id
-    GROUP BY books.id
-    ORDER BY times_issued DESC
-    LIMIT 5
-    ''')
-    top5 = c.fetchall()
+    top5 = conn.execute(SQL_TOP5_BOOKS).fetchall()
     print('Top 5 Most Issued Books:')
     if top5:
         headers = ['BookID','Title','Author','TimesIssued']
-        data = [[r['id'], r['title'], r['author'], r['times_issued']] for r in top5]
+        data = [tuple(r) for r in top5]
         print_table(data, headers)
     else:
         print('No data')
 
-    c.execute('''
-    SELECT books.category, COUNT(issues.id) as issued_count
-    FROM books JOIN issues ON books.id = issues.book_id
-    GROUP BY books.category
-    ''')
-    category_counts = c.fetchall()
+    category_counts = conn.execute(SQL_CATEGORY_ISSUE_COUNTS).fetchall()
 
     if plt is None:
         print('matplotlib not installed -> Charts unavailable. To view charts, install matplotlib (pip install matplotlib)')
         return
 
-    categories = [r['category'] for r in category_counts]
-    counts = [r['issued_count'] for r in category_counts]
+    categories = [r[0] for r in category_counts]
+    counts = [r[1] for r in category_counts]
 
     fig1 = plt.figure(figsize=(10,4))
     ax1 = fig1.add_subplot(1,2,1)
@@ -657,12 +911,32 @@ def show_dashboard(conn: sqlite3.Connection):
 
 # ---------------------- Backup & Restore ----------------------
 
+def _scan_backups():
+    return sorted(name for name in os.listdir(BACKUP_DIR) if name != os.path.basename(BACKUP_INDEX))
+
+
 def backup_database():
     if not os.path.exists(BACKUP_DIR):
         os.makedirs(BACKUP_DIR)
     ts = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
     dest = os.path.join(BACKUP_DIR, f'library_backup_{ts}.db')
-    shutil.copy2(DB_FILE, dest)
+    if not os.path.exists(BACKUP_INDEX):
+        # first indexed backup: carry over anything already in the folder
+        with open(BACKUP_INDEX, 'w') as f:
+            f.writelines(name + '\n' for name in _scan_backups())
+    # online backup API: copies pages under SQLite's own locking, so the
+    # live WAL database is captured consistently
+    # a second backup within the same second overwrites the same file, which
+    # is already listed in the index
+    existed = os.path.exists(dest)
+    dst = sqlite3.connect(dest)
+    with dst:
+        get_connection().backup(dst, pages=-1)
+    dst.close()
+    if not existed:
+        # names are timestamped, so appending keeps the index sorted
+        with open(BACKUP_INDEX, 'a') as f:
+            f.write(os.path.basename(dest) + '\n')
     print('Backup created at', dest)
 
 
@@ -670,7 +944,11 @@ def list_backups():
     if not os.path.exists(BACKUP_DIR):
         print('No backups found.')
         return []
-    items = sorted(os.listdir(BACKUP_DIR))
+    if os.path.exists(BACKUP_INDEX):
+        with open(BACKUP_INDEX) as f:
+            items = [line.strip() for line in f if line.strip()]
+    else:
+        items = _scan_backups()
     for i, name in enumerate(items, start=1):
         print(f'{i}) {name}')
     return items
@@ -685,7 +963,23 @@ def restore_database():
         print('Invalid choice.')
         return
     src = os.path.join(BACKUP_DIR, items[int(choice)-1])
-    shutil.copy2(src, DB_FILE)
+    if not os.path.exists(src):
+        print('Backup file is missing:', src)
+        return
+    # restore through the same API; a raw file copy would leave the -wal
+    # file of the live database out of step with the restored pages
+    backup = sqlite3.connect(src)
+    try:
+        with get_connection() as live:
+            backup.backup(live, pages=-1)
+    except sqlite3.DatabaseError as e:
+        # e.g. a stray non-SQLite file picked up by _scan_backups()
+        print('Cannot restore from', src, '-', e)
+        return
+    finally:
+        backup.close()
+    _invalidate_analytics()
+    _user_row.cache_clear()
     print('Database restored from', src)
 
 
@@ -695,11 +989,29 @@ def print_table(data, headers=None):
     if tabulate:
         print(tabulate(data, headers=headers, tablefmt='psql'))
     else:
-        if headers:
-            print(' | '.join(headers))
-            print('-' * 40)
-        for row in data:
-            print(' | '.join(str(x) for x in row))
+        # build the whole table first so it goes out in a single write
+        lines = [' | '.join(headers), '-' * 40] if headers else []
+        lines.extend(' | '.join(map(str, row)) for row in data)
+        if lines:
+            sys.stdout.write('\n'.join(lines) + '\n')
+
+
+def print_table_stream(rows, headers=None):
+    """Print rows straight off a cursor and return how many were printed."""
+    if tabulate:
+        # tabulate sizes columns from every row, so it needs them all up front
+        data = [tuple(r) for r in rows]
+        if data:
+            print_table(data, headers)
+        return len(data)
+    write = sys.stdout.write
+    count = 0
+    for row in rows:
+        if count == 0 and headers:
+            write(' | '.join(headers) + '\n' + '-' * 40 + '\n')
+        write(' | '.join(map(str, row)) + '\n')
+        count += 1
+    return count
 
 
 # ---------------------- Authentication & CLI ----------------------
@@ -708,62 +1020,98 @@ def authenticate(conn: sqlite3.Connection):
     print('Login')
     username = input_nonempty('Username: ')
     pwd = getpass.getpass('Password: ').strip()
-    c = conn.cursor()
-    c.execute('SELECT * FROM users WHERE username=?', (username,))
-    user = c.fetchone()
-    if not user:
+    user = _user_row(conn, username)
+    if not user or not hmac.compare_digest(user['password'], hash_password(pwd)):
         print('Invalid username or password.')
         return None
-    if user['password'] != hash_password(pwd):
-        print('Invalid username or password.')
-        return None
-    return dict(user)
+    return {k: user[k] for k in ('id', 'username', 'role', 'created_at')}
+
+
+# Menus never change, so render each one in a single write.
+ADMIN_MENU = (
+    'Logged in as ADMIN: {user}\n'
+    '1) User Management\n'
+    '2) Book Management\n'
+    '3) Issue / Return\n'
+    '4) Search & Filter\n'
+    '5) Dashboard & Analytics\n'
+    '6) Advanced Analytics\n'
+    '7) Backup / Restore\n'
+    '8) Reset ANY User Password\n'
+    '9) Change My Password\n'
+    '0) Logout\n'
+)
+
+USER_MENU = (
+    'Logged in as USER: {user}\n'
+    '1) View Books (Search)\n'
+    '2) View My Issued Books\n'
+    '3) Return Book\n'
+    '4) Change My Password\n'
+    '0) Logout\n'
+)
+
+MAIN_MENU = (
+    '=== Library Management System (CBSE Class 12 IP) ===\n'
+    '1) Login\n'
+    '2) Exit\n'
+)
+
+USER_MGMT_MENU = (
+    'User Management\n'
+    '1) Create user\n'
+    '2) Update user\n'
+    '3) Delete user\n'
+    '4) List users\n'
+    '0) Back\n'
+)
+
+BOOK_MGMT_MENU = (
+    'Book Management\n'
+    '1) Add Book\n'
+    '2) Update Book\n'
+    '3) Delete Book\n'
+    '4) List All Books\n'
+    '0) Back\n'
+)
+
+ISSUE_RETURN_MENU = (
+    'Issue & Return\n'
+    '1) Issue Book\n'
+    '2) Return Book\n'
+    '3) List Currently Issued Books\n'
+    '0) Back\n'
+)
+
+SEARCH_FILTER_MENU = (
+    'Search & Filter\n'
+    '1) Search Books\n'
+    '2) Filter by Status\n'
+    '0) Back\n'
+)
+
+ANALYTICS_MENU = (
+    '===== ADVANCED ANALYTICS MENU =====\n'
+    '1) Monthly Issues Trend (Line Chart)\n'
+    '2) Monthly Returns Trend (Line Chart)\n'
+    '3) Category-wise Availability (Bar Chart)\n'
+    '4) User-wise Issue Frequency (Histogram)\n'
+    '5) Issued vs Returned Comparative Trend (Double Line Chart)\n'
+    '6) Back to Dashboard\n'
+)
 
 
 def admin_menu(conn: sqlite3.Connection, user: dict):
+    assert conn is _CONN, 'menus must share the session connection'
     while True:
-        os.system('cls' if os.name == 'nt' else 'clear')
-        print(f"Logged in as ADMIN: {user['username']}")
-        print('1) User Management')
-        print('2) Book Management')
-        print('3) Issue / Return')
-        print('4) Search & Filter')
-        print('5) Dashboard & Analytics')
-        print('6) Advanced Analytics')
-        print('7) Backup / Restore')
-        print('8) Reset ANY User Password')
-        print('9) Change My Password')
-        print('0) Logout')
+        _redraw(ADMIN_MENU.format(user=user['username']))
         choice = input_nonempty('Choice: ')
-        if choice == '1':
-            admin_user_management(conn)
-        elif choice == '2':
-            admin_book_management(conn)
-        elif choice == '3':
-            issue_return_menu(conn)
-        elif choice == '4':
-            search_filter_menu(conn)
-        elif choice == '5':
-            show_dashboard(conn)
-            pause()
-        elif choice == '6':
-            analytics_menu(conn)
-        elif choice == '7':
-            print('1) Backup database  2) Restore database')
-            c = input_nonempty('Choice: ')
-            if c == '1':
-                backup_database()
-            elif c == '2':
-                restore_database()
-            else:
-                print('Invalid.')
-            pause()
-        elif choice == '8':
-            reset_user_password(conn)
-            pause()
-        elif choice == '9':
-            change_password(conn, user['id'])
-            pause()
+        entry = _ADMIN_HANDLERS.get(choice)
+        if entry:
+            fn, wait = entry
+            fn(conn, user)
+            if wait:
+                pause()
         elif choice == '0':
             break
         else:
@@ -772,26 +1120,13 @@ def admin_menu(conn: sqlite3.Connection, user: dict):
 
 
 def user_menu(conn: sqlite3.Connection, user: dict):
+    assert conn is _CONN, 'menus must share the session connection'
     while True:
-        os.system('cls' if os.name == 'nt' else 'clear')
-        print(f"Logged in as USER: {user['username']}")
-        print('1) View Books (Search)')
-        print('2) View My Issued Books')
-        print('3) Return Book')
-        print('4) Change My Password')
-        print('0) Logout')
+        _redraw(USER_MENU.format(user=user['username']))
         choice = input_nonempty('Choice: ')
-        if choice == '1':
-            search_books(conn)
-            pause()
-        elif choice == '2':
-            list_my_issued_books(conn, user['id'])
-            pause()
-        elif choice == '3':
-            return_book(conn)
-            pause()
-        elif choice == '4':
-            change_password(conn, user['id'])
+        fn = _USER_HANDLERS.get(choice)
+        if fn:
+            fn(conn, user)
             pause()
         elif choice == '0':
             break
@@ -802,20 +1137,27 @@ def user_menu(conn: sqlite3.Connection, user: dict):
 
 # Admin sub-menus
 
+def backup_restore_menu():
+    print('1) Backup database  2) Restore database')
+    c = input_nonempty('Choice: ')
+    if c == '1':
+        backup_database()
+    elif c == '2':
+        restore_database()
+    else:
+        print('Invalid.')
+
+
 def admin_user_management(conn: sqlite3.Connection):
+    assert conn is _CONN, 'menus must share the session connection'
     while True:
-        print('User Management')
-        print('1) Create user')
-        print('2) Update user')
-        print('3) Delete user')
-        print('4) List users')
-        print('0) Back')
+        sys.stdout.write(USER_MGMT_MENU)
         c = input_nonempty('Choice: ')
         if c == '1':
             username = input_nonempty('Username: ')
             pwd = getpass.getpass('Password: ').strip()
             role = input_nonempty('Role (admin/user): ')
-            if role not in ('admin','user'):
+            if role not in _ROLES:
                 print('Invalid role.')
                 continue
             create_user(conn, username, pwd, role)
@@ -827,7 +1169,7 @@ def admin_user_management(conn: sqlite3.Connection):
             uid = int(uid)
             new_username = input('New username (leave blank to keep): ').strip() or None
             new_role = input('New role (admin/user) (leave blank to keep): ').strip() or None
-            if new_role and new_role not in ('admin','user'):
+            if new_role and new_role not in _ROLES:
                 print('Invalid role.')
                 continue
             update_user(conn, uid, new_username, new_role)
@@ -838,38 +1180,28 @@ def admin_user_management(conn: sqlite3.Connection):
                 continue
             delete_user(conn, int(uid))
         elif c == '4':
-            c = conn.cursor()
-            c.execute('SELECT id,username,role,created_at FROM users')
-            rows = c.fetchall()
-            data = [[r['id'], r['username'], r['role'], r['created_at']] for r in rows]
-            print_table(data, ['ID','Username','Role','CreatedAt'])
+            if not print_table_stream(conn.execute(SQL_LIST_USERS), ['ID','Username','Role','CreatedAt']):
+                print('No users found.')
         elif c == '0':
             break
         else:
             print('Invalid choice.')
 
 
+def list_books_with_status(conn: sqlite3.Connection):
+    headers = ['ID','Title','Author','Category','Status','Issued To','Issue Date']
+    if not print_table_stream(conn.execute(SQL_LIST_BOOKS_STATUS), headers):
+        print('No books found.')
+
+
 def admin_book_management(conn: sqlite3.Connection):
+    assert conn is _CONN, 'menus must share the session connection'
     while True:
-        print('Book Management')
-        print('1) Add Book')
-        print('2) Update Book')
-        print('3) Delete Book')
-        print('4) List All Books')
-        print('0) Back')
+        sys.stdout.write(BOOK_MGMT_MENU)
         c = input_nonempty('Choice: ')
-        if c == '1':
-            add_book(conn)
-        elif c == '2':
-            update_book(conn)
-        elif c == '3':
-            delete_book(conn)
-        elif c == '4':
-            c = conn.cursor()
-            c.execute('SELECT * FROM books')
-            rows = c.fetchall()
-            data = [[r['id'], r['title'], r['author'], r['category'], r['status']] for r in rows]
-            print_table(data, ['ID','Title','Author','Category','Status'])
+        fn = _BOOK_HANDLERS.get(c)
+        if fn:
+            fn(conn)
         elif c == '0':
             break
         else:
@@ -877,19 +1209,13 @@ def admin_book_management(conn: sqlite3.Connection):
 
 
 def issue_return_menu(conn: sqlite3.Connection):
+    assert conn is _CONN, 'menus must share the session connection'
     while True:
-        print('Issue & Return')
-        print('1) Issue Book')
-        print('2) Return Book')
-        print('3) List Currently Issued Books')
-        print('0) Back')
+        sys.stdout.write(ISSUE_RETURN_MENU)
         c = input_nonempty('Choice: ')
-        if c == '1':
-            issue_book(conn)
-        elif c == '2':
-            return_book(conn)
-        elif c == '3':
-            list_issued_books(conn)
+        fn = _ISSUE_RETURN_HANDLERS.get(c)
+        if fn:
+            fn(conn)
         elif c == '0':
             break
         else:
@@ -897,16 +1223,13 @@ def issue_return_menu(conn: sqlite3.Connection):
 
 
 def search_filter_menu(conn: sqlite3.Connection):
+    assert conn is _CONN, 'menus must share the session connection'
     while True:
-        print('Search & Filter')
-        print('1) Search Books')
-        print('2) Filter by Status')
-        print('0) Back')
+        sys.stdout.write(SEARCH_FILTER_MENU)
         c = input_nonempty('Choice: ')
-        if c == '1':
-            search_books(conn)
-        elif c == '2':
-            filter_by_status(conn)
+        fn = _SEARCH_FILTER_HANDLERS.get(c)
+        if fn:
+            fn(conn)
         elif c == '0':
             break
         else:
@@ -914,30 +1237,96 @@ def search_filter_menu(conn: sqlite3.Connection):
 
 
 def list_my_issued_books(conn: sqlite3.Connection, user_id: int):
-    c = conn.cursor()
-    c.execute('''
-    SELECT issues.id as issue_id, books.id as book_id, books.title, issues.issue_date, issues.return_date, issues.returned
-    FROM issues JOIN books ON books.id = issues.book_id
-    WHERE issues.user_id=? ORDER BY issues.issue_date DESC
-    ''', (user_id,))
-    rows = c.fetchall()
+    # one page at a time, so a long history is never held in memory at once
+    rows = conn.execute(SQL_MY_ISSUED_FIRST, (user_id, MY_ISSUED_PAGE_SIZE)).fetchall()
     if not rows:
         print('No issued books for you.')
         return
-    data = [[r['issue_id'], r['book_id'], r['title'], r['issue_date'], r['return_date'], r['returned']] for r in rows]
-    print_table(data, ['IssueID','BookID','Title','IssueDate','ReturnDate','Returned'])
+    outstanding, overdue = conn.execute(SQL_MY_ISSUED_TOTALS, (user_id,)).fetchone()
+    first = True
+    while rows:
+        print_table([tuple(r) for r in rows],
+                    ['IssueID','BookID','Title','IssueDate','ReturnDate','Returned'])
+        if first:
+            print('Outstanding:', outstanding, '| Overdue:', overdue)
+            first = False
+        if len(rows) < MY_ISSUED_PAGE_SIZE:
+            return
+        if input('Enter for more, q to stop: ').strip().lower() == 'q':
+            return
+        last = rows[-1]
+        rows = conn.execute(SQL_MY_ISSUED_NEXT,
+                            (user_id, last[3], last[0], MY_ISSUED_PAGE_SIZE)).fetchall()
+
+
+# Menu dispatch tables: choice -> handler. Built once at import, after every
+# handler above exists. Top-level menus pass (conn, user) and say whether to
+# pause() afterwards; sub-menus pass conn only.
+_ADMIN_HANDLERS = {
+    '1': (lambda conn, user: admin_user_management(conn), False),
+    '2': (lambda conn, user: admin_book_management(conn), False),
+    '3': (lambda conn, user: issue_return_menu(conn), False),
+    '4': (lambda conn, user: search_filter_menu(conn), False),
+    '5': (lambda conn, user: show_dashboard(conn), True),
+    '6': (lambda conn, user: analytics_menu(conn), False),
+    '7': (lambda conn, user: backup_restore_menu(), True),
+    '8': (lambda conn, user: reset_user_password(conn), True),
+    '9': (lambda conn, user: change_password(conn, user['id']), True),
+}
+
+_USER_HANDLERS = {
+    '1': lambda conn, user: search_books(conn),
+    '2': lambda conn, user: list_my_issued_books(conn, user['id']),
+    '3': lambda conn, user: return_book(conn),
+    '4': lambda conn, user: change_password(conn, user['id']),
+}
+
+_BOOK_HANDLERS = {
+    '1': add_book,
+    '2': update_book,
+    '3': delete_book,
+    '4': list_books_with_status,
+}
+
+_ISSUE_RETURN_HANDLERS = {
+    '1': issue_book,
+    '2': return_book,
+    '3': list_issued_books,
+}
+
+_SEARCH_FILTER_HANDLERS = {
+    '1': search_books,
+    '2': filter_by_status,
+}
+
+_ANALYTICS_HANDLERS = {
+    '1': show_monthly_issues,
+    '2': show_monthly_returns,
+    '3': show_category_availability,
+    '4': show_user_issue_histogram,
+    '5': show_issue_return_comparison,
+}
 
 
 # ---------------------- Main ----------------------
 
 def main():
-    initialize_database()
-    conn = get_connection()
+    conn = initialize_database()
+    if len(sys.argv) > 1 and sys.argv[1] == '--batch':
+        if len(sys.argv) != 3:
+            print('Usage: python3 project_lib.py --batch FILE')
+            conn.close()
+            sys.exit(2)
+        try:
+            ok = run_batch(conn, sys.argv[2])
+        except (OSError, ValueError) as e:
+            # ValueError covers UnicodeDecodeError from a non-UTF-8 file
+            print('Cannot read batch file:', e)
+            ok = False
+        conn.close()
+        sys.exit(0 if ok else 1)
     while True:
-        os.system('cls' if os.name == 'nt' else 'clear')
-        print('=== Library Management System (CBSE Class 12 IP) ===')
-        print('1) Login')
-        print('2) Exit')
+        _redraw(MAIN_MENU)
         choice = input_nonempty('Choice: ')
         if choice == '1':
             user = authenticate(conn)